@@ -0,0 +1,217 @@
+"""Модуль отложенной записи дат. Накапливает вызовы UniCores.set_date и записывает их пакетами."""
+
+import atexit
+import threading
+from datetime import datetime
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import OperationalError
+from app.util.db import db
+from app.util import log
+
+
+lg = log.getlogger('api')
+
+
+class DateBuffer:
+    """
+    Класс буфера отложенной записи дат. Буфер хранит только последнее значение для
+    каждой тройки (класс, id, атрибут). Фоновый поток записывает буфер в бд раз в
+    interval секунд или при накоплении max_size значений, одним пакетным UPDATE на
+    каждую пару (класс, атрибут). При завершении процесса буфер записывается автоматически.
+    """
+    __buffer = {}
+    __lock = threading.Lock()
+    __flush_lock = threading.Lock()
+    __wakeup = threading.Event()
+    __stopping = threading.Event()
+    __thread = None
+    __accepting = False
+    __max_size = 1000
+    __interval = 1.0
+    __registered = False
+
+    @staticmethod
+    def start(max_size=1000, interval=1.0):
+        """
+        Функция включения режима отложенной записи и запуска фонового потока.
+
+        Args:
+            max_size (int): количество значений в буфере, при котором запись начинается досрочно
+            interval (float): период записи буфера в секундах
+        """
+
+        if DateBuffer.is_active():
+            return
+        DateBuffer.__max_size = max_size
+        DateBuffer.__interval = interval
+        DateBuffer.__stopping.clear()
+        with DateBuffer.__lock:
+            DateBuffer.__accepting = True
+        DateBuffer.__thread = threading.Thread(target=DateBuffer.__run, name='DateBuffer',
+                                               daemon=True)
+        DateBuffer.__thread.start()
+        if not DateBuffer.__registered:  # Запись буфера при завершении процесса
+            atexit.register(DateBuffer.stop)
+            DateBuffer.__registered = True
+
+    @staticmethod
+    def stop():
+        """Функция остановки фонового потока с записью оставшихся значений буфера"""
+        with DateBuffer.__lock:  # После этого put() больше не принимает значения
+            DateBuffer.__accepting = False
+        thread = DateBuffer.__thread
+        if thread is not None:
+            DateBuffer.__stopping.set()
+            DateBuffer.__wakeup.set()
+            thread.join()
+            DateBuffer.__thread = None
+        DateBuffer.flush()
+
+    @staticmethod
+    def is_active():
+        """Функция проверки включенного режима отложенной записи"""
+        return DateBuffer.__accepting
+
+    @staticmethod
+    def size():
+        """Функция получения количества значений, ожидающих записи"""
+        return len(DateBuffer.__buffer)
+
+    @staticmethod
+    def put(obj_class, id, attr_date, date):
+        """
+        Функция добавления даты в буфер. Предыдущее значение для того же объекта
+        и атрибута заменяется. Принимаются только значения datetime для полей,
+        которые есть в __fields_dict__ и являются колонками таблицы.
+
+        Args:
+            obj_class (class): пользовательский класс экземпляра
+            id (int): id объекта
+            attr_date (str): наименование поля даты
+            date (datetime): дата для установки
+
+        Returns:
+            bool: True, если дата принята в буфер, False - режим отложенной записи выключен
+            или значение не может быть записано отложенно
+        """
+
+        if not DateBuffer.__is_valid(obj_class, attr_date, date):
+            return False
+        with DateBuffer.__lock:
+            if not DateBuffer.__accepting:
+                return False
+            DateBuffer.__buffer[(obj_class, id, attr_date)] = date
+            size = len(DateBuffer.__buffer)
+        if size >= DateBuffer.__max_size:
+            DateBuffer.__wakeup.set()
+        return True
+
+    @staticmethod
+    def discard(obj_class, id, *attrs):
+        """
+        Функция удаления из буфера значений полей attrs объекта. Вызывается перед прямой
+        записью этих полей в бд, чтобы более старое отложенное значение не перезаписало
+        новое. Если запись буфера уже выполняется, функция дожидается ее окончания.
+
+        Args:
+            obj_class (class): пользовательский класс экземпляра
+            id (int): id объекта
+            attrs (str): наименования полей
+        """
+
+        with DateBuffer.__flush_lock:
+            with DateBuffer.__lock:
+                for attr in attrs:
+                    DateBuffer.__buffer.pop((obj_class, id, attr), None)
+
+    @staticmethod
+    def flush():
+        """
+        Функция записи накопленных значений в бд. Значения группируются по паре
+        (класс, атрибут), каждая группа записывается одним UPDATE с набором параметров
+        (executemany). Отсутствующие в бд id не обновляют ни одной строки и не считаются
+        ошибкой. Если группу записать не удалось, ее значения записываются по одному:
+        значения, запись которых не удалась из-за недоступности бд (OperationalError),
+        возвращаются в буфер, если за это время для них не появилось более новых значений,
+        остальные ошибочные значения отбрасываются с записью в лог.
+
+        Returns:
+            int: количество записанных значений
+        """
+
+        with DateBuffer.__flush_lock:
+            if not DateBuffer.__buffer:
+                return 0
+            session = db.create_session()
+            with DateBuffer.__lock:
+                buffer = DateBuffer.__buffer
+                DateBuffer.__buffer = {}
+
+            groups = {}
+            for (obj_class, id, attr_date), date in buffer.items():
+                groups.setdefault((obj_class, attr_date), []).append(
+                    {'b_id': id, 'b_date': date})
+
+            count = 0
+            try:
+                for (obj_class, attr_date), params in groups.items():
+                    try:
+                        session.execute(DateBuffer.__get_update(obj_class, attr_date), params)
+                        session.commit()
+                        count += len(params)
+                    except Exception:
+                        session.rollback()
+                        # Поиск ошибочных значений группы записью по одному
+                        for param in params:
+                            count += DateBuffer.__write_one(session, obj_class, attr_date, param)
+            finally:
+                session.close()
+            return count
+
+    @staticmethod
+    def __write_one(session, obj_class, attr_date, param):
+        try:
+            session.execute(DateBuffer.__get_update(obj_class, attr_date), [param])
+            session.commit()
+            return 1
+        except Exception as error:
+            session.rollback()
+            if isinstance(error, OperationalError):  # Бд недоступна, значение будет записано позже
+                with DateBuffer.__lock:
+                    DateBuffer.__buffer.setdefault(
+                        (obj_class, param['b_id'], attr_date), param['b_date'])
+                action = "::Значение возвращено в буфер::"
+            else:
+                action = "::Значение отброшено::"
+            lg.warning(str(type(error)) + "::" + str(obj_class) + "::" + str(param['b_id']) +
+                       "::" + attr_date + "::" + str(param['b_date']) + action + str(error))
+            return 0
+
+    @staticmethod
+    def __is_valid(obj_class, attr_date, date):
+        # Отложенно записываются только даты в поля-колонки из __fields_dict__
+        if not isinstance(date, datetime) or attr_date not in (obj_class.__fields_dict__ or {}):
+            return False
+        try:
+            return bool(obj_class.__mapper__.get_property(attr_date).columns)
+        except Exception:
+            return False
+
+    @staticmethod
+    def __get_update(obj_class, attr_date):
+        # UPDATE без проверки числа измененных строк, в отличие от bulk_update_mappings
+        mapper = obj_class.__mapper__
+        column = mapper.get_property(attr_date).columns[0]
+        pk = mapper.get_property('id').columns[0]
+        return update(column.table).where(pk == bindparam('b_id')).values(
+            {column: bindparam('b_date')})
+
+    @staticmethod
+    def __run():
+        while not DateBuffer.__stopping.is_set():
+            DateBuffer.__wakeup.wait(DateBuffer.__interval)
+            DateBuffer.__wakeup.clear()
+            try:
+                DateBuffer.flush()
+            except Exception as error:
+                lg.warning(str(type(error)) + "::Ошибка отложенной записи дат::" + str(error))
@@ -0,0 +1,132 @@
+"""Модуль потоковой сериализации объектов пользовательских классов в JSON."""
+
+import json
+from app.core.models import UniCore
+
+try:  # Быстрая библиотека JSON используется при ее наличии
+    import orjson
+except ImportError:
+    orjson = None
+
+
+__plans = {}
+
+
+def dumps(data):
+    """
+    Функция сериализации данных в JSON. Значения, которые JSON не поддерживает
+    (Decimal, datetime и прочие, в том числе во вложенных словарях и списках),
+    преобразуются через UniCore.convert_value одинаково для обеих библиотек.
+
+    Args:
+        data (object): данные для сериализации
+
+    Returns:
+        bytes: JSON в кодировке UTF-8
+    """
+
+    if orjson is not None:
+        # Без OPT_PASSTHROUGH_DATETIME orjson записывает даты в формате ISO, а не str()
+        return orjson.dumps(data, default=UniCore.convert_value,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'),
+                      default=UniCore.convert_value).encode('utf-8')
+
+
+def get_plan(obj_class):
+    """
+    Функция получения плана полей класса - кортежа атрибутов из __fields_dict__.
+    План создается один раз для каждого класса и кешируется.
+
+    Args:
+        obj_class (class): пользовательский класс экземпляра или класс записи UniRecord
+
+    Returns:
+        tuple: названия атрибутов в порядке __fields_dict__
+    """
+
+    plan = __plans.get(obj_class)
+    if plan is None:
+        plan = tuple(obj_class.__fields_dict__.keys())
+        __plans[obj_class] = plan
+    return plan
+
+
+def to_dict(obj):
+    """
+    Функция получения словаря объекта по плану полей. Значения преобразуются так же,
+    как в UniCore.get_dict, для словарей преобразуются значения верхнего уровня.
+
+    Args:
+        obj (object): объект UniCore, запись UniRecord или словарь
+
+    Returns:
+        dict: словарь атрибутов объекта
+    """
+
+    convert = UniCore.convert_value
+    if isinstance(obj, dict):
+        return {key: convert(val) for key, val in obj.items()}
+    return {attr: convert(getattr(obj, attr)) for attr in get_plan(type(obj))}
+
+
+def encode(obj):
+    """
+    Функция сериализации одного объекта в JSON.
+
+    Args:
+        obj (object): объект UniCore, запись UniRecord или словарь
+
+    Returns:
+        bytes: объект в формате JSON
+    """
+
+    return dumps(to_dict(obj))
+
+
+def iter_encode(objs, chunk_size=100):
+    """
+    Генератор JSON-массива по частям. Объекты сериализуются по одному, в памяти
+    одновременно находится не более chunk_size сериализованных объектов, поэтому
+    objs может быть генератором или запросом к бд с постраничной выборкой.
+
+    Args:
+        objs (iterable): объекты UniCore, записи UniRecord или словари
+        chunk_size (int): количество объектов в одной части
+
+    Returns:
+        generator: части JSON-массива в виде bytes
+    """
+
+    parts = [b'[']
+    first = True
+    for obj in objs:
+        if not first:
+            parts.append(b',')
+        parts.append(encode(obj))
+        first = False
+        if len(parts) >= chunk_size * 2:
+            yield b''.join(parts)
+            parts = []
+    parts.append(b']')
+    yield b''.join(parts)
+
+
+def write(objs, fp, chunk_size=100):
+    """
+    Функция записи JSON-массива объектов в файловый объект по частям.
+
+    Args:
+        objs (iterable): объекты UniCore, записи UniRecord или словари
+        fp (file): файловый объект, открытый на запись в двоичном режиме
+        chunk_size (int): количество объектов в одной части
+
+    Returns:
+        int: количество записанных байт
+    """
+
+    size = 0
+    for part in iter_encode(objs, chunk_size):
+        fp.write(part)
+        size += len(part)
+    return size
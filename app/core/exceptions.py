@@ -47,6 +47,12 @@ class UniCoreSomeEx(CoreEx):
         self.message = "Ошибка некоторого действия: " + message
 
 
+class UniCoreImportEx(CoreEx):
+
+    def __init__(self, message):
+        self.message = "Ошибка импорта: " + message
+
+
 # # # # # # # # # # Common # # # # # # # # # # #
 class ObjectNotFound(CoreEx):
 
@@ -0,0 +1,298 @@
+"""Модуль потокового импорта данных из файлов CSV/JSON Lines в пользовательские классы."""
+
+import csv
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from sqlalchemy import and_, or_
+from app.util.db import db
+from app.core.exceptions import *
+from app.util import log
+from app.util.util import parse_datetime, parse_datetime_ms, parse_datetime_tz, parse_datetime_db
+
+
+lg = log.getlogger('api')
+
+# Функции разбора дат, перебираются по порядку до первого успешного
+DATE_PARSERS = (parse_datetime_db, parse_datetime_ms, parse_datetime_tz, parse_datetime)
+# Строковые значения логического типа
+BOOL_VALUES = {'1': True, 'true': True, 't': True, 'yes': True,
+               '0': False, 'false': False, 'f': False, 'no': False}
+
+
+class ImportStats:
+    """Класс статистики импорта: количество прочитанных, добавленных и отклоненных записей"""
+
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.started = time.monotonic()
+
+    def get_dict(self):
+        """
+        Функция получения словаря статистики импорта.
+
+        Returns:
+            dict: счетчики записей, время выполнения в секундах и скорость (записей в секунду)
+        """
+
+        elapsed = time.monotonic() - self.started
+        return {'read': self.read, 'inserted': self.inserted, 'rejected': self.rejected,
+                'duplicates': self.duplicates, 'elapsed': round(elapsed, 3),
+                'rate': round(self.read / elapsed, 1) if elapsed else 0.0}
+
+
+def import_file(path, obj_class, exc=UniCoreImportEx, fmt=None, chunk_size=1000, workers=None,
+                reject_path=None, converters=None, progress=None):
+    """
+    Функция потокового импорта файла в бд. Файл читается порциями по chunk_size записей,
+    разбор и проверка порций выполняются в пуле процессов, добавление в бд - в текущем
+    процессе пакетами по одной порции. Повторы определяются по полю __non_repeat__
+    пользовательского класса. Одновременно в обработке находится не более 2 * workers
+    порций, поэтому потребление памяти не зависит от размера файла.
+
+    Args:
+        path (str): путь к файлу
+        obj_class (class): пользовательский класс экземпляра
+        exc (class): пользовательский класс ошибки, по умолчанию UniCoreImportEx
+        fmt (str): формат файла, "csv" или "jsonl", по умолчанию определяется по расширению
+         (.csv, .jsonl, .ndjson)
+        chunk_size (int): количество записей в порции
+        workers (int): количество процессов разбора, 0 - разбор в текущем процессе,
+         по умолчанию количество процессоров
+        reject_path (str): путь к файлу отклоненных записей, по умолчанию path + ".rejects.jsonl"
+        converters (dict): функции преобразования значений по названию поля, должны быть
+         доступны для импорта в дочерних процессах
+        progress (function): функция, вызываемая со словарем статистики после каждой порции
+
+    Returns:
+        dict: статистика импорта, иначе Exception
+    """
+
+    stats = ImportStats()
+    try:
+        fmt = fmt or _get_format(path)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if reject_path is None:
+            reject_path = path + '.rejects.jsonl'
+
+        chunks = _read_chunks(path, fmt, chunk_size)
+        with open(reject_path, 'w', encoding='utf-8') as reject:
+            if workers:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    pending = deque()
+                    for chunk in chunks:
+                        pending.append(pool.submit(_prepare_chunk, obj_class, fmt, chunk,
+                                                   converters))
+                        if len(pending) >= workers * 2:  # Ограничение порций в обработке
+                            _write_chunk(pending.popleft().result(), obj_class, stats,
+                                         reject, progress)
+                    while pending:
+                        _write_chunk(pending.popleft().result(), obj_class, stats,
+                                     reject, progress)
+            else:
+                for chunk in chunks:
+                    _write_chunk(_prepare_chunk(obj_class, fmt, chunk, converters), obj_class,
+                                 stats, reject, progress)
+
+        lg.info(str(obj_class) + "::" + str(path) + "::Импорт завершен::" +
+                str(stats.get_dict()))
+        return stats.get_dict()
+    except Exception as error:
+        lg.warning(str(type(error)) + "::" + str(obj_class) + "::" + str(path) + "::" +
+                   str(exc(str(error))))
+        raise exc(str(error))
+
+
+def convert_value(value, type_):
+    """
+    Функция приведения значения из файла к типу поля из __fields_dict__.
+
+    Args:
+        value (object): значение из файла
+        type_ (type): тип поля
+
+    Returns:
+        object: значение требуемого типа, иначе ValueError
+    """
+
+    if value == '':  # Пустая строка в CSV означает отсутствие значения для любого типа
+        return None
+    if isinstance(value, str) and type_ is not str:
+        if type_ is datetime:
+            for parser in DATE_PARSERS:
+                try:
+                    return parser(value)
+                except ValueError:
+                    pass
+            raise ValueError('Wrong date: %s' % value)
+        if type_ is bool:
+            if value.lower() in BOOL_VALUES:
+                return BOOL_VALUES[value.lower()]
+            raise ValueError('Wrong bool: %s' % value)
+        try:
+            if type_ in (dict, list):
+                return json.loads(value)
+            return type_(value)
+        except Exception:
+            raise ValueError('Wrong %s: %s' % (type_.__name__, value))
+    if type_ is Decimal and type(value) in (int, float):
+        return Decimal(str(value))
+    if type_ is float and type(value) == int:
+        return float(value)
+    return value
+
+
+def _get_format(path):
+    """Определение формата файла по расширению"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if ext == '.json':
+        raise ValueError('Файл .json должен быть в формате JSON Lines (одна запись в строке), '
+                         'укажите fmt="jsonl" или расширение .jsonl: ' + path)
+    raise ValueError('Неизвестный формат файла: ' + path)
+
+
+def _read_chunks(path, fmt, chunk_size):
+    """
+    Генератор порций записей файла. Каждая запись - пара (номер строки, данные),
+    для CSV данные - словарь строк, для JSON Lines - необработанная строка.
+    """
+
+    with open(path, newline='', encoding='utf-8') as file:
+        if fmt == 'csv':
+            reader = csv.DictReader(file)
+            records = ((reader.line_num, row) for row in reader)
+        else:
+            records = ((num, line.rstrip('\r\n')) for num, line in enumerate(file, 1)
+                       if line.strip())
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            yield chunk
+
+
+def _prepare_chunk(obj_class, fmt, chunk, converters=None):
+    """
+    Разбор и проверка порции записей. Выполняется в дочернем процессе.
+
+    Returns:
+        tuple: список корректных записей (номер строки, исходные данные, словарь) и список
+        отклоненных записей (номер строки, исходные данные, ошибка)
+    """
+
+    fields = obj_class.__fields_dict__
+    obj = obj_class()
+    rows = []
+    rejects = []
+    for num, data in chunk:
+        try:
+            obj_dict = json.loads(data) if fmt == 'jsonl' else dict(data)
+            if not isinstance(obj_dict, dict):
+                raise ValueError('Запись не является объектом')
+            obj_dict.pop('id', None)  # ID в бд проставляется автоматически
+            obj_dict.pop('current_user_id', None)
+            for attr in obj_dict.keys():
+                try:
+                    if converters and attr in converters:
+                        obj_dict[attr] = converters[attr](obj_dict[attr])
+                    elif attr in fields:
+                        obj_dict[attr] = convert_value(obj_dict[attr], fields[attr]['type'])
+                except Exception as error:  # В ошибке указывается поле с неверным значением
+                    raise ValueError(attr + ': ' + str(error))
+            # Удаляем пустые значения, чтобы проверка обязательных полей сработала корректно
+            obj_dict = {attr: val for attr, val in obj_dict.items() if val is not None}
+            if not obj.check_obj(obj_dict):
+                raise WrongDataEx('Неверный формат данных при работе с полями объекта')
+            rows.append((num, data, obj_dict))
+        except Exception as error:
+            rejects.append((num, data, str(error)))
+    return rows, rejects
+
+
+def _write_chunk(prepared, obj_class, stats, reject, progress):
+    """Добавление подготовленной порции в бд, запись отклоненных строк и статистики"""
+    rows, rejects = prepared
+    stats.read += len(rows) + len(rejects)
+    for num, data, error in rejects:
+        _reject(reject, stats, num, data, error)
+
+    rows = _filter_repeats(rows, obj_class, stats, reject)
+    if rows:
+        session = db.session()
+        try:
+            # Пакетное добавление без создания объектов и без identity map
+            session.bulk_insert_mappings(obj_class, [row for num, data, row in rows])
+            session.commit()
+            stats.inserted += len(rows)
+        except Exception:
+            session.rollback()
+            # Пакет отклонен целиком, добавляем записи по одной для поиска ошибочных
+            for num, data, row in rows:
+                try:
+                    session.bulk_insert_mappings(obj_class, [row])
+                    session.commit()
+                    stats.inserted += 1
+                except Exception as error:
+                    session.rollback()
+                    _reject(reject, stats, num, data, str(error))
+
+    lg.info(str(obj_class) + "::Импорт::" + str(stats.get_dict()))
+    if progress:
+        progress(stats.get_dict())
+
+
+def _filter_repeats(rows, obj_class, stats, reject):
+    """Исключение из порции повторов внутри порции и объектов, уже существующих в бд"""
+    non_repeat = getattr(obj_class, '__non_repeat__', None)
+    if not non_repeat or not rows:
+        return rows
+
+    keys = list(non_repeat.keys())
+    unique = {}
+    for num, data, row in rows:
+        key = tuple(row.get(k) for k in keys)
+        if key in unique:
+            stats.duplicates += 1
+            _reject(reject, stats, num, data, 'Такой объект уже существует')
+        else:
+            unique[key] = (num, data, row)
+
+    session = db.session()
+    try:
+        query = session.query(*[non_repeat[k] for k in keys]).filter(
+            or_(*[and_(*[non_repeat[k] == key[i] for i, k in enumerate(keys)])
+                  for key in unique]))
+        if obj_class().has_attr('date_del'):  # Среди удаленных объектов повторы не ищем
+            query = query.filter(obj_class.date_del.is_(None))
+        existing = set(tuple(row) for row in query.all())
+    finally:
+        session.rollback()  # Завершение транзакции чтения, в том числе при ошибке
+
+    result = []
+    for key, (num, data, row) in unique.items():
+        if key in existing:
+            stats.duplicates += 1
+            _reject(reject, stats, num, data, 'Такой объект уже существует')
+        else:
+            result.append((num, data, row))
+    return result
+
+
+def _reject(reject, stats, num, data, error):
+    """Запись отклоненной строки в файл отклоненных записей"""
+    stats.rejected += 1
+    reject.write(json.dumps({'line': num, 'error': error, 'data': data},
+                            ensure_ascii=False, default=str) + '\n')
@@ -1,6 +1,7 @@
 """Модуль для общих классов и методов. Ядро для наследования пользовательскими классами."""
 
 from app.util.db import db
+from app.core.buffer import DateBuffer
 from app.core.exceptions import *
 from datetime import datetime
 from decimal import Decimal
@@ -60,19 +61,32 @@ class UniCore:
 
         d = {}
         for attr in self.__fields_dict__.keys():  # Цикл по всем атрибутам объекта в __fields_dict__
-            val = self.__getattribute__(attr)  # Извлекаем значение атрибута конкретного объекта
-            if type(val) == float or type(val) == int:  # Атрибут числового типа
-                d[attr] = val
-            elif isinstance(val, dict) or isinstance(val, list):  # Атрибут составного типа
-                d[attr] = val
-            elif isinstance(val, Decimal):  # Атрибут числового типа Decimal конвертируется в float
-                d[attr] = float(str(val))
-            elif val is None:  # Атрибут имеет значение None
-                d[attr] = None
-            else:
-                d[attr] = str(val)
+            # Извлекаем значение атрибута конкретного объекта
+            d[attr] = UniCore.convert_value(self.__getattribute__(attr))
         return d
 
+    @staticmethod
+    def convert_value(val):
+        """
+        Функция преобразования значения атрибута к виду, пригодному для JSON.
+
+        Args:
+            val (object): значение атрибута
+
+        Returns:
+            object: число, словарь, список, None или строка
+        """
+
+        if type(val) == float or type(val) == int:  # Атрибут числового типа
+            return val
+        elif isinstance(val, dict) or isinstance(val, list):  # Атрибут составного типа
+            return val
+        elif isinstance(val, Decimal):  # Атрибут числового типа Decimal конвертируется в float
+            return float(str(val))
+        elif val is None:  # Атрибут имеет значение None
+            return None
+        return str(val)
+
     def update(self, obj_dict):
         """
         Функция изменения атрибутов объекта на поля из obj_dict.
@@ -129,6 +143,8 @@ class UniCore:
         """
 
         try:
+            if not hasattr(type(self), attr_date):  # Поля нет у пользовательского класса
+                raise AttributeError("Неизвестное поле " + str(attr_date))
             if date:  # Конкретная дата передана
                 self.__setattr__(attr_date, date)
             else:  # Дата проставляется текущая
@@ -155,6 +171,59 @@ class UniCore:
             return False
 
 
+class UniRecord:
+    """
+    Класс легковесных записей только для чтения. Записи строятся напрямую из строк
+    запроса к бд, минуя identity map сессии и инструментирование ORM.
+    Для каждого пользовательского класса генерируется свой подкласс со __slots__
+    из полей __fields_dict__.
+    """
+    __slots__ = ()
+    __fields_dict__ = None
+    __classes = {}
+
+    # Получение словаря полностью совпадает с UniCore.get_dict
+    get_dict = UniCore.get_dict
+    has_attr = UniCore.has_attr
+
+    def __init__(self, row):
+        for attr, val in zip(self.__fields_dict__.keys(), row):
+            object.__setattr__(self, attr, val)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Запись " + type(self).__name__ + " доступна только для чтения")
+
+    def __repr__(self):
+        return type(self).__name__ + "(" + ", ".join(
+            attr + "=" + repr(getattr(self, attr)) for attr in self.__fields_dict__.keys()) + ")"
+
+    @staticmethod
+    def get_class(obj_class):
+        """
+        Функция получения класса записи для пользовательского класса obj_class.
+        Класс создается один раз и кешируется.
+
+        Args:
+            obj_class (class): пользовательский класс экземпляра
+
+        Returns:
+            class: класс записи, наследник UniRecord
+        """
+
+        record_class = UniRecord.__classes.get(obj_class)
+        if record_class is None:
+            fields = tuple(obj_class.__fields_dict__.keys())
+            record_class = type(obj_class.__name__ + "Record", (UniRecord,),
+                                {"__slots__": fields, "__fields_dict__": obj_class.__fields_dict__})
+            UniRecord.__classes[obj_class] = record_class
+        return record_class
+
+    @staticmethod
+    def get_columns(obj_class):
+        """Функция получения списка колонок запроса в порядке полей __fields_dict__"""
+        return [getattr(obj_class, attr) for attr in obj_class.__fields_dict__.keys()]
+
+
 class UniCores:
     """Класс для общих методов обработки экземпляров пользовательских классов"""
 
@@ -245,6 +314,8 @@ class UniCores:
                     if 'current_user_id' in obj_dict:
                         obj_dict.pop('current_user_id', None)
                     obj.update(obj_dict)  # Передаем словарь данных в метод update в классе UniCore
+                    # Отложенные даты этих полей устарели и не должны перезаписать новые значения
+                    DateBuffer.discard(obj_class, int(obj_dict['id']), *obj_dict.keys())
                     session.add(obj)  # Работа с сессией, добавление, коммит
                     session.commit()
                     lg.info(str(obj_class) + "::" + str(obj_dict['id']) +
@@ -271,10 +342,13 @@ class UniCores:
             иначе поиск среди только неудаленных
            obj_class (class): пользовательский класс экземпляра
            exc (class): пользовательский класс ошибки
-           mode_return (str): режим возврата данных, "raw_obj" возращается объект, иначе словарь
+           mode_return (str): режим возврата данных, "raw_obj" возращается объект,
+            "record" - легковесная запись UniRecord только для чтения (без ORM-объекта
+            и identity map сессии), иначе словарь
 
         Returns:
-           dict: объект в формате JSON (или объект, если mode_return='raw_obj'), иначе Exception
+           dict: объект в формате JSON (или объект, если mode_return='raw_obj',
+           или запись, если mode_return='record'), иначе Exception
         """
 
         session = db.session()
@@ -286,15 +360,23 @@ class UniCores:
                 id = int(id)
                 obj = None
 
+                if mode_return == 'record':
+                    # Запрос только колонок: строки не попадают в identity map сессии
+                    query = session.query(*UniRecord.get_columns(obj_class))
+                else:
+                    query = session.query(obj_class)
+
                 if obj_dict.get('mode') == 'all':  # Передан параметр mode для поиска в бд
                     # Получение любого (удаленного, неудаленного) объекта
-                    obj = session.query(obj_class).filter(obj_class.id == id).first()
+                    obj = query.filter(obj_class.id == id).first()
                 else:
                     if obj_class().has_attr('date_del'):  # Есть дата удаления у объекта
                         # Получение неудаленного объекта
-                        obj = session.query(obj_class).filter(obj_class.id == id,
-                                                              obj_class.date_del is None).first()
+                        obj = query.filter(obj_class.id == id,
+                                           obj_class.date_del is None).first()
                 if obj:
+                    if mode_return == 'record':
+                        return UniRecord.get_class(obj_class)(obj)
                     if mode_return == 'raw_obj':
                         return obj
                     return obj.get_dict()
@@ -337,6 +419,7 @@ class UniCores:
                         UniCores.delete_hard(obj, obj_class, exc)
                     else:
                         obj.delete()
+                        DateBuffer.discard(obj_class, int(id), 'date_del')
                         session.commit()
                     lg.info(str(obj_class) + "::" + str(obj.id) + "::Объект успешно удален")
                     return True
@@ -385,6 +468,11 @@ class UniCores:
     def set_date(obj_dict, attr_date, obj_class, exc, date=None, return_obj=False):
         """
         Функция установки даты в бд общая. Используется для установки даты блокировки и прочего.
+        При включенном режиме отложенной записи (DateBuffer.start()) и return_obj=False дата
+        помещается в буфер и записывается в бд фоновым потоком, наличие объекта в бд
+        при этом не проверяется. Значения, которые буфер не принимает (не datetime или
+        поле не является колонкой из __fields_dict__), записываются напрямую.
+        При прямой записи значение этого поля в буфере отбрасывается.
 
         Args:
             obj_dict (dict): словарь, который содержит обязательный параметр - ключ "id"
@@ -403,6 +491,13 @@ class UniCores:
         try:
             id = UniCores.get_id_from_obj_dict(obj_dict, obj_class)
             if check.isdigit(id):  # Проверка id объекта
+                # Отложенная запись даты, если режим включен
+                if not return_obj and DateBuffer.put(obj_class, int(id), attr_date,
+                                                     date or datetime.utcnow()):
+                    return True
+
+                # Отложенное значение устарело и не должно перезаписать прямую запись
+                DateBuffer.discard(obj_class, int(id), attr_date)
                 obj = session.query(obj_class).get(int(id))  # Получение объекта
                 if obj:
                     obj.set_date(attr_date, date)  # Установка даты в атрибуты объекта
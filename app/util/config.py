@@ -35,7 +35,10 @@ def get_config(name=None):
 def set_config(name, data):
     global __config
     if not len(__config.keys()):
-        read_config()
+        try:
+            read_config()
+        except RuntimeError:  # Конфигурация может задаваться без файлов
+            pass
     if len(name) == 0:
         return False
     __config[name] = data
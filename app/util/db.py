@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+import sys
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from app.util import config, log
 
@@ -9,6 +10,13 @@ class db:
     __count_i = 0
     __count_s = 0
     __conf = {}
+    # Политики жизненного цикла сессии, применяются после каждого коммита общей сессии:
+    # expunge_on_commit - очищать identity map после каждого коммита,
+    # max_identity_size - очищать identity map при превышении числа объектов (0 - без ограничения),
+    # expunge_every - очищать identity map после заданного числа коммитов (0 - никогда)
+    __policy = {'expunge_on_commit': False, 'max_identity_size': 0, 'expunge_every': 0}
+    __policy_loaded = False
+    __commits = 0
 
     @staticmethod
     def get():
@@ -22,8 +30,130 @@ class db:
             db.__count_s += 1
             session = sessionmaker(bind=db.get())
             db.__sessions.append(session())
+            event.listen(db.__sessions[db.__count_s - 1], 'after_commit', db.__after_commit)
         return db.__sessions[db.__count_s - 1]
 
+    @staticmethod
+    def create_session():
+        """
+        Функция создания отдельной сессии, не связанной с общей сессией процесса.
+        Используется в фоновых потоках, вызывающая сторона сама закрывает сессию.
+        """
+        return sessionmaker(bind=db.get())()
+
+    @staticmethod
+    def set_policy(expunge_on_commit=None, max_identity_size=None, expunge_every=None):
+        """
+        Функция установки политик жизненного цикла сессии. Политики применяются сразу
+        после коммита общей сессии, когда в ней нет несохраненных изменений. Значения
+        по умолчанию берутся из ключа "session" конфигурации бд.
+
+        Объекты, полученные с mode_return='raw_obj' и удерживаемые
+        между вызовами UniCores, после очистки становятся отсоединенными (detached):
+        их изменения не попадут в бд при db.commit(), пока объект не добавлен в сессию
+        заново через session.add().
+
+        Args:
+            expunge_on_commit (bool): очищать identity map после каждого коммита
+            max_identity_size (int): максимальное число объектов в identity map, 0 - без ограничения
+            expunge_every (int): очищать identity map после заданного числа коммитов, 0 - никогда
+
+        Returns:
+            dict: действующие политики
+        """
+
+        db.__get_policy()
+        db.__policy.update(db.__coerce_policy({'expunge_on_commit': expunge_on_commit,
+                                               'max_identity_size': max_identity_size,
+                                               'expunge_every': expunge_every}))
+        return dict(db.__policy)
+
+    @staticmethod
+    def release(close=False):
+        """
+        Функция принудительного освобождения объектов сессии. Загруженные объекты
+        становятся отсоединенными (detached) от сессии.
+
+        Args:
+            close (bool): True - закрыть сессию с возвратом соединения в пул,
+             иначе только очистить identity map
+        """
+
+        if db.__count_s == 0:
+            return
+        session = db.__sessions[db.__count_s - 1]
+        if close:
+            session.close()
+        else:
+            session.expunge_all()
+        db.__commits = 0
+
+    @staticmethod
+    def identity_size():
+        """Функция получения количества объектов в identity map сессии"""
+        if db.__count_s == 0:
+            return 0
+        return len(db.__sessions[db.__count_s - 1].identity_map)
+
+    @staticmethod
+    def memory_usage():
+        """
+        Функция приблизительной оценки памяти, занимаемой объектами сессии. Учитываются
+        сами объекты, их словари атрибутов и значения атрибутов верхнего уровня.
+
+        Returns:
+            int: приблизительный размер в байтах
+        """
+
+        if db.__count_s == 0:
+            return 0
+        size = 0
+        for obj in list(db.__sessions[db.__count_s - 1].identity_map.values()):
+            size += sys.getsizeof(obj) + sys.getsizeof(obj.__dict__)
+            for val in obj.__dict__.values():
+                size += sys.getsizeof(val)
+        return size
+
+    @staticmethod
+    def stats():
+        """
+        Функция получения состояния сессии.
+
+        Returns:
+            dict: число объектов в identity map, оценка памяти в байтах,
+            число коммитов с последней очистки сессии и действующие политики
+        """
+
+        return {'identity_size': db.identity_size(), 'memory_usage': db.memory_usage(),
+                'commits': db.__commits, 'policy': dict(db.__get_policy())}
+
+    @staticmethod
+    def __get_policy():
+        if not db.__policy_loaded:
+            db.__policy_loaded = True
+            db.__policy.update(db.__coerce_policy(db.__get_config().get('session', {})))
+        return db.__policy
+
+    @staticmethod
+    def __coerce_policy(policy):
+        # Приведение значений политик к нужным типам, неизвестные ключи и None отбрасываются
+        types = {'expunge_on_commit': bool, 'max_identity_size': int, 'expunge_every': int}
+        return {key: types[key](val) for key, val in policy.items()
+                if key in types and val is not None}
+
+    @staticmethod
+    def __after_commit(session):
+        # Событие вызывается до пометки объектов устаревшими, поэтому отсоединенные здесь
+        # объекты сохраняют загруженные значения атрибутов
+        db.__commits += 1
+        policy = db.__get_policy()
+        if (policy['expunge_on_commit'] or
+                (policy['expunge_every'] and db.__commits >= policy['expunge_every']) or
+                (policy['max_identity_size'] and
+                 len(session.identity_map) > policy['max_identity_size'])):
+            session.expunge_all()
+            db.__commits = 0
+
     @staticmethod
     def schema():
         conf = db.__get_config()
@@ -0,0 +1,96 @@
+"""
+Проверка буфера отложенной записи дат DateBuffer на SQLite во временном файле:
+неверные значения не попадают в буфер и вызывают ошибку при прямой записи,
+ошибочное значение в группе не мешает записи остальных значений группы,
+отсутствующий в бд id не считается ошибкой.
+
+Запуск из корня репозитория:
+    python tools/check_date_buffer.py
+"""
+
+import logging
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.util import config
+
+# Файловая бд, так как фоновая запись использует отдельное соединение
+__db_file = os.path.join(tempfile.mkdtemp(), 'check_date_buffer.db')
+config.set_config('local', {'db': {'conn_string': 'sqlite:///' + __db_file}})
+
+from sqlalchemy import CheckConstraint, Column, DateTime, Integer, String
+from sqlalchemy.orm import declarative_base
+from app.util.db import db
+from app.core.buffer import DateBuffer
+from app.core.models import UniCore, UniCores
+from app.core.exceptions import UniCoreUpdateEx
+
+Base = declarative_base()
+
+
+class Item(Base, UniCore):
+    __tablename__ = 'item'
+    __table_args__ = (CheckConstraint("date_act IS NULL OR date_act >= '2000-01-01'"),)
+    __fields_dict__ = {'id': {'type': int}, 'name': {'type': str},
+                       'date_act': {'type': datetime}}
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    date_act = Column(DateTime)
+
+
+def get_date(id):
+    session = db.create_session()
+    try:
+        return session.query(Item).get(id).date_act
+    finally:
+        session.close()
+
+
+def main():
+    logging.disable(logging.WARNING)  # Ошибки записи ожидаемы и пишутся в лог
+    Base.metadata.create_all(db.get())
+    for name in ('a', 'b'):
+        UniCores.add({'name': name}, Item, UniCoreUpdateEx)
+    DateBuffer.start(interval=3600)  # Запись буфера вызывается явно
+
+    errors = []
+    for attr, date in (('date_act', 'garbage'), ('bogus_attr', datetime(2020, 1, 1))):
+        try:
+            UniCores.set_date({'id': 1}, attr, Item, UniCoreUpdateEx, date)
+            errors.append('не было ошибки для ' + attr + '=' + str(date))
+        except UniCoreUpdateEx:
+            pass
+    if DateBuffer.size():
+        errors.append('неверные значения попали в буфер')
+
+    # Группа из ошибочного значения (нарушает CHECK), верного и отсутствующего id
+    good = datetime(2020, 1, 2, 3, 4, 5)
+    UniCores.set_date({'id': 1}, 'date_act', Item, UniCoreUpdateEx, datetime(1990, 1, 1))
+    UniCores.set_date({'id': 2}, 'date_act', Item, UniCoreUpdateEx, good)
+    UniCores.set_date({'id': 999}, 'date_act', Item, UniCoreUpdateEx, good)
+    written = DateBuffer.flush()
+    if written != 2:
+        errors.append('записано значений: ' + str(written) + ', ожидалось 2')
+    if DateBuffer.size():
+        errors.append('в буфере осталось значений: ' + str(DateBuffer.size()))
+    if get_date(2) != good:
+        errors.append('дата id 2 не записана: ' + str(get_date(2)))
+    if get_date(1) is not None:
+        errors.append('ошибочная дата id 1 записана: ' + str(get_date(1)))
+    DateBuffer.stop()
+
+    for error in errors:
+        print('FAIL:', error)
+    if errors:
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Проверка потребления памяти общей сессией бд. Выполняет заданное число циклов
+UniCores.get + UniCores.update на SQLite в памяти и проверяет, что размер identity map
+и объем памяти процесса (по tracemalloc) не растут.
+
+Запуск из корня репозитория:
+    python tools/check_session_memory.py [--cycles 1000000] [--rows 10000]
+
+Без tracemalloc цикл занимает доли миллисекунды, с ним миллион циклов выполняется
+десятки минут.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.util import config
+
+# Конфигурация бд задается до подключения к бд, файлы конфигурации не нужны
+config.set_config('local', {'db': {'conn_string': 'sqlite://'}})
+
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.orm import declarative_base
+from app.util.db import db
+from app.core.models import UniCore, UniCores
+from app.core.exceptions import UniCoreGetEx, UniCoreUpdateEx
+
+Base = declarative_base()
+
+
+class Item(Base, UniCore):
+    __tablename__ = 'item'
+    __fields_dict__ = {'id': {'type': int}, 'name': {'type': str}}
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cycles', type=int, default=1000000)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--max-identity-size', type=int, default=1000)
+    parser.add_argument('--held', type=int, default=2000,
+                        help='число объектов, удерживаемых между циклами')
+    parser.add_argument('--tolerance', type=int, default=1024 * 1024,
+                        help='допустимый рост памяти в байтах')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # UniCores пишет в лог каждое изменение
+    Base.metadata.create_all(db.get())
+    session = db.session()
+    session.bulk_insert_mappings(Item, [{'name': str(i)} for i in range(args.rows)])
+    session.commit()
+    db.set_policy(max_identity_size=args.max_identity_size)
+
+    # Объекты, удерживаемые вызывающей стороной, как это делают обработчики с raw_obj
+    held = []
+    warmup = min(args.cycles // 10, args.rows)
+    tracemalloc.start()
+    base = None
+    max_identity = 0
+    for i in range(args.cycles):
+        if i == warmup:
+            held.clear()
+            base = tracemalloc.take_snapshot()
+        obj_id = i % args.rows + 1
+        held.append(UniCores.get({'id': obj_id, 'mode': 'all'}, Item, UniCoreGetEx, 'raw_obj'))
+        if len(held) > args.held:
+            held.pop(0)
+        UniCores.update({'id': obj_id, 'name': str(i)}, Item, UniCoreUpdateEx)
+        max_identity = max(max_identity, db.identity_size())
+        if i and i % 100000 == 0:
+            print(i, db.stats())
+
+    held.clear()
+    growth = sum(stat.size_diff for stat in
+                 tracemalloc.take_snapshot().compare_to(base, 'filename'))
+    print('cycles:', args.cycles, 'max identity size:', max_identity,
+          'memory growth:', growth, 'bytes')
+    if max_identity > args.max_identity_size + 1 or growth > args.tolerance:
+        print('FAIL')
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())